@@ -1,10 +1,14 @@
 import streamlit as st
-from sentence_transformers import SentenceTransformer
-from supabase import create_client
-import google.generativeai as genai
-import os
+import asyncio
 from datetime import datetime
-import json
+import logging
+from operator import itemgetter
+
+from cache import SemanticCache, answer_cache_key
+from encoder import MODEL_NAME, ONNX_DIR, OnnxEncoder, export_quantized, has_quantized
+from streaming import stream_answers
+
+logger = logging.getLogger(__name__)
 
 # Suggested test questions
 demo_questions = [
@@ -36,148 +40,56 @@ demo_questions = [
 ]
 
 
-# === Setup your API keys via Streamlit secrets or environment variables ===
-SUPABASE_URL = st.secrets['SUPABASE_URL']
-SUPABASE_KEY = st.secrets['SUPABASE_KEY']
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Static sidebar, rendered with a single markdown call per rerun
+SIDEBAR_MD = """
+# 🏗️ Regulated Builds
+**AI-powered compliance for the built world.**
 
-model = SentenceTransformer("intfloat/e5-base-v2")
-gemini = genai.GenerativeModel("gemini-2.5-pro")
+*We're building the regulatory operating system for construction.*
 
-st.set_page_config(
-    page_title="Regulated Builds – AI Compliance for Construction",
-    layout="centered"
-)
-
-
-st.title("🏗️ Regulated Builds")
-st.markdown("**AI-powered regulatory compliance for the construction industry.**")
-st.markdown("Instantly analyze OSHA, fire codes, permits, and violations for your projects.")
-st.markdown("---")
-st.markdown("📍 *We're building the regulatory OS for construction.*")
-
-
-with st.sidebar:
-    st.title("🏗️ Regulated Builds")
-    st.markdown("**AI-powered compliance for the built world.**")
-    st.markdown("*We're building the regulatory operating system for construction.*")
-    st.markdown("---")
+---
 
-    st.title("🛠️ Product Roadmap")
+# 🛠️ Product Roadmap
 
-    st.markdown("### 🚧 Phase 1: Core Compliance Engine (Now)")
-    st.markdown("""
+### 🚧 Phase 1: Core Compliance Engine (Now)
 - ✅ Top 10 OSHA Citations + LLM Analysis (2/10 Covered + LOIs)
 - 🔄 Match Regulations ↔ Letters of Interpretation
 - 📤 Upload Docs for Permit + Violation Detection
 - 🧪 Clause Filtering (e.g., fall hazards, PPE)
-    """)
 
-    st.markdown("### 🔥 Phase 2: Smart Analysis & Expansion")
-    st.markdown("""
+### 🔥 Phase 2: Smart Analysis & Expansion
 - 🔥 Fire Code Parsing & Search
 - 📚 Full OSHA Subparts Coverage
 - 🧠 Predict Common Violations for Projects
 - 📝 Auto-generate Fall Protection Plans (502(k))
-    """)
 
-    st.markdown("### 🧰 Phase 3: Workflow Automation")
-    st.markdown("""
+### 🧰 Phase 3: Workflow Automation
 - 🛂 Permit Requirements Based on Docs
 - ✍️ Auto-Apply via E-permit APIs
 - 🧾 Track Permit Status by Jurisdiction
-    """)
 
-    st.markdown("### 🏗️ Phase 4: Industry Platform Vision")
-    st.markdown("""
+### 🏗️ Phase 4: Industry Platform Vision
 - 🏛️ Map Agencies by Region + Regulation
 - 📋 Auto-Generated Pre-Inspection Checklists
 - 📊 Compliance Dashboards for Firms
 - 🤖 AI Superintendent Agent (Full Site Scan)
-    """)
 
-    st.markdown("---")
-    st.markdown("💬 *We're building the regulatory OS for construction.*")
+---
 
+💬 *We're building the regulatory OS for construction.*
+"""
 
-query = st.text_input("🔍 Ask an OSHA-related question:", placeholder="e.g. Are there exceptions to the requirement for safety nets?")
-answer_mode = st.radio(
-    "🤖 Choose answer source:",
-    options=["Regulated Builds", "Raw Gemini"],
-    horizontal=True
+DEMO_QUESTIONS_MD = "\n".join(
+    f"### ❓ Q{idx}: {q['question']}\n\n"
+    f"🔸 **Why LLMs Fail:** {q['why_llm_fails']}\n\n"
+    f"✅ **Correct Answer:** {q['correct_answer']}\n\n"
+    "---\n"
+    for idx, q in enumerate(demo_questions, 1)
 )
 
-with st.expander("📋 Suggested Test Questions (LLM Challenge Set)", expanded=False):
-    for idx, q in enumerate(demo_questions, 1):
-        st.markdown(f"### ❓ Q{idx}: {q['question']}")
-        st.markdown(f"🔸 **Why LLMs Fail:** {q['why_llm_fails']}")
-        st.markdown(f"✅ **Correct Answer:** {q['correct_answer']}")
-        st.markdown("---")
-
 
-if st.button("Search"):
-    if not query:
-        st.warning("❗ Please enter a question before searching.")
-        st.stop()  # ⛔ Stops the app right here
-
-    st.write(f"🔎 Searching for: **{query}**")
-
-    if answer_mode == "Regulated Builds":
-        with st.spinner("🔍 Searching regulations..."):
-            embedding = model.encode([query], normalize_embeddings=True)[0]
-            embedding_array = list(map(float, embedding))
-            response = supabase.rpc("match_supporting_docs_grouped", {
-                "query_embedding": embedding_array,
-                "match_count": 5
-            }).execute()
-            clauses = response.data or []
-
-        st.subheader("📘 Relevant OSHA Clauses")
-        context_blocks = []
-        for clause in clauses:
-            with st.expander(f"🔹 {clause['clause_section_id']}: {clause['clause_title']}"):
-                st.markdown(f"**Summary:** {clause['clause_summary']}")
-                st.markdown(f"**Violations (FY2024):** {clause.get('violations_fy2024', 'N/A')}")
-                st.markdown(f"**Hazard Type:** {clause.get('hazard_type', 'N/A')}")
-                st.markdown(f"**Applies To:** {', '.join(clause.get('applies_to', []) or [])}")
-                st.markdown(f"**Protective Equipment:** {clause.get('protective_equipment', 'N/A')}")
-                clause_block = f"""
-🔹 {clause['clause_section_id']}: {clause['clause_title']}
-Summary: {clause['clause_summary']}
-Violations (FY2024): {clause.get('violations_fy2024', 'N/A')}
-Hazard Type: {clause.get('hazard_type', 'N/A')}
-Applies To: {', '.join(clause.get('applies_to', []) or [])}
-Protective Equipment: {clause.get('protective_equipment', 'N/A')}
-""".strip()
-
-                doc_blocks = []
-                for doc in clause.get("support_docs", []):
-                    with st.expander(f"📄 {doc.get('support_title', 'N/A')} | {doc.get('support_publication_date', 'N/A')}"):
-                        st.markdown("---")
-                        st.markdown(f"✅ **Supporting Document: {doc['support_title']}**")
-                        st.markdown(f"• **Summary:** {doc['support_summary']}")
-                        st.markdown(f"• **Compliance Guidance:** {doc.get('support_compliance_guidance', '')}")
-                        st.markdown(f"• **Enforcement Notes:** {doc.get('support_enforcement_notes', '')}")
-                        st.markdown(f"• **Revised Date:** {doc.get('support_revised_date', 'N/A')}")
-                        st.markdown(f"• **Publication Type:** {doc.get('support_publication_type', 'N/A')}")
-                        st.markdown(f"• **URL:** {doc['support_url']}")
-                        doc_blocks.append(f"""
-            ✅ Support Doc: {doc['support_title']}
-            - Summary: {doc['support_summary']}
-            - Guidance: {doc.get('support_compliance_guidance', '')}
-            - Notes: {doc.get('support_enforcement_notes', '')}
-            - URL: {doc['support_url']}
-            - Related Sections: {doc.get('support_related_sections', 'N/A')}
-            - Type: {doc.get('support_publication_type', 'N/A')}
-            - Published: {doc.get('support_publication_date', 'N/A')}
-            """.strip())
-
-            full_block = f"{clause_block}\n\n" + "\n\n".join(doc_blocks)
-            context_blocks.append(full_block)
-
-    # Set a prompt based on Type
-    if answer_mode == "Regulated Builds":
-        prompt = f"""
+# === Prompt templates: the static preamble is built once; only the query/context tail varies ===
+PROMPT_PREAMBLE = """
 You are a top-tier OSHA compliance advisor assisting field professionals, safety officers, and legal teams.
 
 Your task is to answer the user’s question with clarity, precision, and regulatory grounding — using only the information provided in the **clause summaries**, **supporting documents**, and **enforcement notes**.
@@ -193,53 +105,299 @@ Your task is to answer the user’s question with clarity, precision, and regula
 8. Never assume or invent interpretations — if unclear, write: `"Not clear from provided context."`
 
 ---
+"""
 
-❓ **User Question**:
-{query.strip()}
+PREAMBLE_RB = PROMPT_PREAMBLE + "\n❓ **User Question**:\n"
+CONTEXT_SEP_RB = "\n\n---\n\n📘 **Regulatory Context**:\n"
+ANSWER_SEP_RB = "\n\n---\n\n💬 **Answer**:\n"
 
----
+PREAMBLE_RAW = PROMPT_PREAMBLE + "Question:\n"
+ANSWER_SEP_RAW = "\n\n---\nAnswer:\n"
 
-📘 **Regulatory Context**:
-{'\n'.join(context_blocks)}
 
----
+# === Setup your API keys via Streamlit secrets or environment variables ===
+SUPABASE_URL = st.secrets['SUPABASE_URL']
+SUPABASE_KEY = st.secrets['SUPABASE_KEY']
 
-💬 **Answer**:
-"""
-    else:
-        prompt = f"""
-You are a top-tier OSHA compliance advisor assisting field professionals, safety officers, and legal teams.
 
-Your task is to answer the user’s question with clarity, precision, and regulatory grounding — using only the information provided in the **clause summaries**, **supporting documents**, and **enforcement notes**.
+# === Heavy resources are built once per process and shared across reruns/sessions ===
+# Their imports (torch, grpc, httpx, numba) are deferred to the first search so the page renders first
+@st.cache_resource(show_spinner=False)
+def get_supabase():
+    # httpx advertises br alongside gzip/deflate once `brotli` is installed (see requirements.txt)
+    from supabase import create_client
+
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+@st.cache_resource(show_spinner=False)
+def get_model():
+    # Prefer the int8 ONNX export, building it into the persistent cache on first start;
+    # fall back to PyTorch if the export toolchain isn't available
+    try:
+        if not has_quantized(ONNX_DIR):
+            export_quantized(ONNX_DIR)
+        return OnnxEncoder(ONNX_DIR)
+    except Exception:
+        logger.exception("ONNX encoder unavailable; falling back to PyTorch for this process")
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(MODEL_NAME)
+
+
+def get_gemini(api_key):
+    import google.generativeai as genai
+
+    # Not cached: a GenerativeModel binds the process-global client on its first call, so a
+    # shared instance would keep whichever key came first. Models are cheap to build.
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel("gemini-2.5-pro")
+
+
+@st.cache_resource(show_spinner=False)
+def _load_local_index():
+    import httpx
+    from postgrest.exceptions import APIError
+
+    from retrieval import load_local_index
+
+    # Only transient failures propagate (st.cache_resource doesn't keep them, so the next search
+    # retries); anything else, e.g. a missing table, is cached as "no local index"
+    try:
+        return load_local_index(get_supabase())
+    except httpx.TransportError:
+        raise
+    except APIError as e:
+        # PGRST0xx: PostgREST couldn't reach the database (503/504)
+        if str(e.code).startswith("PGRST0"):
+            raise
+        logger.exception("Supabase rejected the corpus load; using the RPC until restart")
+        return None
+    except Exception:
+        logger.exception("Building the local clause index failed; using the RPC until restart")
+        return None
+
+
+def get_local_index():
+    # Supabase stays the source of truth; if the corpus can't be loaded we fall back to the RPC
+    try:
+        return _load_local_index()
+    except Exception:
+        logger.exception("Loading the local clause index failed; retrying on the next search")
+        return None
+
+
+@st.cache_resource
+def get_semantic_cache():
+    return SemanticCache()
+
+
+@st.cache_resource(show_spinner=False)
+def demo_embeddings():
+    # One padded batch for all suggested questions instead of one forward pass each
+    questions = [q["question"] for q in demo_questions]
+    embeddings = get_model().encode(questions, batch_size=len(questions), normalize_embeddings=True)
+    embeddings.setflags(write=False)
+    return dict(zip(questions, embeddings))
+
+
+@st.cache_resource(max_entries=1024, show_spinner=False)
+def embed_query(query):
+    """Exact-match cache in front of the transformer; the returned array is read-only."""
+    embedding = demo_embeddings().get(query)
+    if embedding is None:
+        embedding = get_model().encode([query], normalize_embeddings=True)[0]
+        embedding.setflags(write=False)
+    return embedding
+
+
+async def retrieve(query):
+    # Query encoding (CPU) overlaps with the corpus load (network) on the first search
+    return await asyncio.gather(
+        asyncio.to_thread(embed_query, query),
+        asyncio.to_thread(get_local_index),
+    )
+
+
+# === Clause formatting (prompt context) and rendering (UI) are kept separate ===
+_CLAUSE_KEYS = (
+    "clause_section_id", "clause_title", "clause_summary", "violations_fy2024",
+    "hazard_type", "applies_to", "protective_equipment",
+)
+_CLAUSE_DEFAULTS = {**dict.fromkeys(_CLAUSE_KEYS, "N/A"), "applies_to": None}
+_get_clause_fields = itemgetter(*_CLAUSE_KEYS)
+
+
+def _clause_fields(clause):
+    return _get_clause_fields({**_CLAUSE_DEFAULTS, **clause})
+
+
+def _fmt_clause(clause):
+    cid, title, summary, v24, htype, appls, ppe = _clause_fields(clause)
+    return "\n".join([
+        f"🔹 {cid}: {title}",
+        f"Summary: {summary}",
+        f"Violations (FY2024): {v24}",
+        f"Hazard Type: {htype}",
+        f"Applies To: {', '.join(appls or [])}",
+        f"Protective Equipment: {ppe}",
+    ])
+
+
+def _fmt_doc(doc):
+    return "\n".join([
+        f"✅ Support Doc: {doc['support_title']}",
+        f"- Summary: {doc['support_summary']}",
+        f"- Guidance: {doc.get('support_compliance_guidance', '')}",
+        f"- Notes: {doc.get('support_enforcement_notes', '')}",
+        f"- URL: {doc['support_url']}",
+        f"- Related Sections: {doc.get('support_related_sections', 'N/A')}",
+        f"- Type: {doc.get('support_publication_type', 'N/A')}",
+        f"- Published: {doc.get('support_publication_date', 'N/A')}",
+    ])
+
+
+def _render_clause(clause):
+    cid, title, summary, v24, htype, appls, ppe = _clause_fields(clause)
+    with st.expander(f"🔹 {cid}: {title}"):
+        st.markdown(f"**Summary:** {summary}")
+        st.markdown(f"**Violations (FY2024):** {v24}")
+        st.markdown(f"**Hazard Type:** {htype}")
+        st.markdown(f"**Applies To:** {', '.join(appls or [])}")
+        st.markdown(f"**Protective Equipment:** {ppe}")
+
+        for doc in clause.get("support_docs", []):
+            with st.expander(f"📄 {doc.get('support_title', 'N/A')} | {doc.get('support_publication_date', 'N/A')}"):
+                st.markdown("---")
+                st.markdown(f"✅ **Supporting Document: {doc['support_title']}**")
+                st.markdown(f"• **Summary:** {doc['support_summary']}")
+                st.markdown(f"• **Compliance Guidance:** {doc.get('support_compliance_guidance', '')}")
+                st.markdown(f"• **Enforcement Notes:** {doc.get('support_enforcement_notes', '')}")
+                st.markdown(f"• **Revised Date:** {doc.get('support_revised_date', 'N/A')}")
+                st.markdown(f"• **Publication Type:** {doc.get('support_publication_type', 'N/A')}")
+                st.markdown(f"• **URL:** {doc['support_url']}")
+
+
+def build_prompt(mode, query, context_blocks):
+    if mode == "Regulated Builds":
+        return "".join((
+            PREAMBLE_RB, query.strip(),
+            CONTEXT_SEP_RB, "\n".join(context_blocks),
+            ANSWER_SEP_RB,
+        ))
+    return "".join((PREAMBLE_RAW, query, ANSWER_SEP_RAW))
 
-**Your response must:**
-1. Be written in **clear, practical English** suitable for field decision-makers.
-2. Explicitly cite the applicable **OSHA section ID(s)** (e.g., `1926.501(b)(11)`).
-3. State whether the rule is **mandatory**, **conditional**, or **guidance only**.
-4. Identify **who it applies to** and **where** (if applicable).
-5. Include any **exceptions**, **scope limitations**, or **state plan differences**.
-6. Indicate the **likelihood of citation or violation**, based on past enforcement patterns or violation frequency.
-7. Highlight **common compliance pitfalls**, enforcement notes, or case-by-case considerations.
-8. Never assume or invent interpretations — if unclear, write: `"Not clear from provided context."`
+st.set_page_config(
+    page_title="Regulated Builds – AI Compliance for Construction",
+    layout="centered"
+)
 
----
-Question:
-{query}
 
----
-Answer:
-"""    
-    
+st.title("🏗️ Regulated Builds")
+st.markdown("**AI-powered regulatory compliance for the construction industry.**")
+st.markdown("Instantly analyze OSHA, fire codes, permits, and violations for your projects.")
+st.markdown("---")
+st.markdown("📍 *We're building the regulatory OS for construction.*")
+
+
+with st.sidebar:
+    st.markdown(SIDEBAR_MD)
+
+
+query = st.text_input("🔍 Ask an OSHA-related question:", placeholder="e.g. Are there exceptions to the requirement for safety nets?")
+answer_mode = st.radio(
+    "🤖 Choose answer source:",
+    options=["Regulated Builds", "Raw Gemini", "Compare both"],
+    horizontal=True
+)
+
+with st.expander("📋 Suggested Test Questions (LLM Challenge Set)", expanded=False):
+    st.markdown(DEMO_QUESTIONS_MD)
+
+
+if st.button("Search"):
+    if not query:
+        st.warning("❗ Please enter a question before searching.")
+        st.stop()  # ⛔ Stops the app right here
+
+    st.write(f"🔎 Searching for: **{query}**")
+
+    clauses = []
+    context_blocks = []
+    if answer_mode != "Raw Gemini":
+        with st.spinner("🔍 Searching regulations..."):
+            embedding, local_index = asyncio.run(retrieve(query))
+            cached_clauses = get_semantic_cache().lookup(embedding)
+            if cached_clauses is not None:
+                clauses = cached_clauses
+            else:
+                if local_index is not None:
+                    clauses = local_index.search(embedding, k=5)
+                else:
+                    embedding_array = embedding.tolist()
+                    response = get_supabase().rpc("match_supporting_docs_grouped", {
+                        "query_embedding": embedding_array,
+                        "match_count": 5
+                    }).execute()
+                    clauses = response.data or []
+                get_semantic_cache().add(embedding, clauses)
+
+        st.subheader("📘 Relevant OSHA Clauses")
+        if cached_clauses is not None:
+            st.caption("♻️ Clauses reused from a near-identical earlier question; the answer below is generated fresh.")
+        context_blocks = [
+            "\n\n".join([_fmt_clause(c)] + [_fmt_doc(d) for d in c.get("support_docs", [])])
+            for c in clauses
+        ]
+        for clause in clauses:
+            _render_clause(clause)
+
+    # Answers already generated this session for the same prompt inputs are reused as-is
+    answer_cache = st.session_state.setdefault("answer_cache", {})
+    modes = ["Regulated Builds", "Raw Gemini"] if answer_mode == "Compare both" else [answer_mode]
+    keys = [answer_cache_key(mode, query, clauses if mode == "Regulated Builds" else []) for mode in modes]
+    answers = [answer_cache.get(key) for key in keys]
+
     with st.spinner("Generating a response..."):
         try:
-            if answer_mode == "Regulated Builds":
-                genai.configure(api_key=st.secrets['GEMINI_KEY_1'])
-            else:
-                genai.configure(api_key=st.secrets['GEMINI_KEY_2'])
-            gemini_response = gemini.generate_content(prompt)
-            answer = gemini_response.text.strip()
             st.subheader("💬 Answer")
-            st.markdown(answer)
+            slots = st.columns(len(modes)) if len(modes) > 1 else [st.container()]
+            placeholders = []
+            for slot, mode, answer in zip(slots, modes, answers):
+                if len(modes) > 1:
+                    slot.markdown(f"**{mode}**")
+                placeholders.append(slot.empty())
+                if answer is not None:
+                    placeholders[-1].markdown(answer)
+
+            # Set a prompt per answer still missing from the caches
+            prompts = {
+                idx: build_prompt(modes[idx], query, context_blocks)
+                for idx, answer in enumerate(answers) if answer is None
+            }
+            if prompts:
+                # The API key is process-global (genai.configure), so both comparison streams share one key
+                if modes == ["Raw Gemini"]:
+                    gemini = get_gemini(st.secrets['GEMINI_KEY_2'])
+                else:
+                    gemini = get_gemini(st.secrets['GEMINI_KEY_1'])
+
+                streamed, errors = stream_answers(gemini, prompts, placeholders)
+                for idx, answer in streamed.items():
+                    answers[idx] = answer
+                    answer_cache[keys[idx]] = answer
+
+                if errors and all(answer is None for answer in answers):
+                    raise next(iter(errors.values()))
+                for idx, error in errors.items():
+                    placeholders[idx].error(f"❌ Gemini failed to generate this answer: {error}")
+
+            if len(modes) > 1:
+                answer = "\n\n".join(
+                    f"## {mode}\n\n{answer}" for mode, answer in zip(modes, answers) if answer is not None
+                )
+            else:
+                answer = answers[0]
 
             if "helpful_count" not in st.session_state:
                 st.session_state.helpful_count = 0
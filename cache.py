@@ -0,0 +1,46 @@
+import threading
+from hashlib import blake2b
+
+import numpy as np
+
+
+class SemanticCache:
+    """In-memory cache of recent queries, matched by cosine similarity of their embeddings.
+
+    Each entry stores only the retrieved clauses, so a near-duplicate question skips the
+    search. Answers are never shared: e5 scores sit in a narrow high band, and questions that
+    differ in one deciding detail (6 ft vs 10 ft, roofer vs HVAC) can still match.
+    """
+
+    def __init__(self, dim=768, threshold=0.97, max_entries=256):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._embeddings = np.empty((0, dim), dtype=np.float32)
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding):
+        """Return the clauses of the closest cached query, or None below the threshold."""
+        with self._lock:
+            if not self._entries:
+                return None
+            # Embeddings are L2-normalized, so the dot product is the cosine similarity
+            scores = self._embeddings @ np.asarray(embedding, dtype=np.float32)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self._entries[best]
+
+    def add(self, embedding, clauses):
+        with self._lock:
+            row = np.asarray(embedding, dtype=np.float32)[None, :]
+            self._embeddings = np.vstack([self._embeddings, row])[-self.max_entries:]
+            self._entries = (self._entries + [clauses])[-self.max_entries:]
+
+
+def answer_cache_key(answer_mode, query, clauses):
+    """Key for a rendered answer: the prompt is fully determined by the mode, query and retrieved clauses."""
+    ids = [clause["clause_section_id"] for clause in clauses]
+    ids += [doc.get("support_url", "") for clause in clauses for doc in clause.get("support_docs", [])]
+    raw = f"{answer_mode}|{query.strip()}|{','.join(map(str, ids))}"
+    return blake2b(raw.encode(), digest_size=16).hexdigest()
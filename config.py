@@ -0,0 +1,4 @@
+import os
+
+# Compiled/exported artifacts live outside the app directory so they survive container restarts
+CACHE_DIR = os.environ.get("REGULATED_BUILDS_CACHE_DIR", os.path.expanduser("~/.streamlit/cache"))
@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+
+from config import CACHE_DIR
+
+MODEL_NAME = "intfloat/e5-base-v2"
+ONNX_DIR = os.path.join(CACHE_DIR, "e5_onnx")
+ONNX_FILE = "model_int8.onnx"
+# Inputs that fit are padded to one fixed length so the main session runs a single static shape;
+# longer ones go through a dynamic-shape session instead of being cut off
+SEQ_LENGTH = 64
+# e5-base-v2's position limit, the same cap sentence-transformers applies
+MAX_SEQ_LENGTH = 512
+
+
+def export_quantized(output_dir=ONNX_DIR, model_name=MODEL_NAME):
+    """Export the sentence-transformer to ONNX and quantize its weights to int8 (run once per cache dir)."""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoTokenizer
+
+    ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    quantize_dynamic(
+        os.path.join(output_dir, "model.onnx"),
+        os.path.join(output_dir, ONNX_FILE),
+        weight_type=QuantType.QInt8,
+    )
+
+
+def has_quantized(model_dir=ONNX_DIR):
+    # The quantized file is written last, so its presence means the export completed
+    return os.path.exists(os.path.join(model_dir, ONNX_FILE))
+
+
+class OnnxEncoder:
+    """Drop-in replacement for SentenceTransformer.encode backed by an int8 ONNX Runtime session."""
+
+    def __init__(self, model_dir=ONNX_DIR):
+        from transformers import AutoTokenizer
+
+        self.model_path = os.path.join(model_dir, ONNX_FILE)
+        self.session = self._make_session(SEQ_LENGTH)
+        self._dynamic_session = None
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _make_session(self, seq_length=None):
+        import onnxruntime as ort
+
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        if seq_length is not None:
+            sess_options.add_free_dimension_override_by_name("sequence_length", seq_length)
+        return ort.InferenceSession(self.model_path, sess_options, providers=["CPUExecutionProvider"])
+
+    def _pad_to_fixed(self, toks):
+        width = SEQ_LENGTH - toks["input_ids"].shape[1]
+        pad_id = self.tokenizer.pad_token_id
+        return {
+            k: np.pad(v, ((0, 0), (0, width)), constant_values=pad_id if k == "input_ids" else 0)
+            for k, v in toks.items()
+        }
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False):
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            toks = dict(self.tokenizer(
+                sentences[start:start + batch_size],
+                padding="longest",
+                max_length=MAX_SEQ_LENGTH,
+                truncation=True,
+                return_tensors="np",
+            ))
+            if toks["input_ids"].shape[1] <= SEQ_LENGTH:
+                toks = self._pad_to_fixed(toks)
+                session = self.session
+            else:
+                # Long pasted scenarios usually end with the actual question, so don't truncate them
+                if self._dynamic_session is None:
+                    self._dynamic_session = self._make_session()
+                session = self._dynamic_session
+            feeds = {k: v.astype(np.int64) for k, v in toks.items() if k in self.input_names}
+            hidden = session.run(None, feeds)[0]
+
+            # Mean pooling over non-padding tokens, as in the e5 sentence-transformers config
+            mask = toks["attention_mask"][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        embeddings = np.ascontiguousarray(np.concatenate(batches), dtype=np.float32)
+        if normalize_embeddings:
+            # Imported here so UI.py can import this module without pulling in numba
+            from kernels import l2norm_inplace
+
+            l2norm_inplace(embeddings)
+        return embeddings
+
+
+if __name__ == "__main__":
+    export_quantized()
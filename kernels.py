@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from config import CACHE_DIR
+
+# Must be set before numba is imported for cache=True kernels to load from the persistent dir
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(CACHE_DIR, "numba"))
+
+import numba  # noqa: E402
+from numba import njit, prange  # noqa: E402
+
+# Kernels run from several Python threads at once (Streamlit sessions, asyncio.to_thread);
+# the workqueue fallback layer aborts on concurrent use, so require TBB (or OpenMP)
+numba.config.THREADING_LAYER = "safe"
+
+
+@njit(fastmath=True, cache=True)
+def cos_scores(E, q):
+    """Cosine scores of q against every row of a row-normalized float32 matrix E."""
+    n, d = E.shape
+    scores = np.empty(n, np.float32)
+    for i in range(n):
+        s = np.float32(0.0)
+        for j in range(d):
+            s += E[i, j] * q[j]
+        scores[i] = s
+    return scores
+
+
+@njit(fastmath=True, cache=True)
+def l2norm_inplace(E):
+    """Row-wise L2 normalization of a float32 matrix, reading each row once for the norm and once to scale."""
+    n, d = E.shape
+    for i in range(n):
+        s = np.float32(0.0)
+        for j in range(d):
+            s += E[i, j] * E[i, j]
+        if s > 0:
+            inv = np.float32(1.0) / np.sqrt(s)
+            for j in range(d):
+                E[i, j] *= inv
+    return E
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def quantize_int8(E):
+    """Symmetric per-row int8 quantization; returns (Eq, scales) with E ~= Eq * scales[:, None]."""
+    scales = (np.max(np.abs(E), axis=1) / 127).astype(np.float32)
+    scales[scales == 0] = 1
+    Eq = np.ascontiguousarray(np.round(E / scales[:, None]), dtype=np.int8)
+    return Eq, scales
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def int8_scores(Eq, scales, q):
+    """Dot products of a float32 query against int8 rows, rescaled by each row's scale."""
+    n, d = Eq.shape
+    scores = np.empty(n, np.float32)
+    for i in prange(n):
+        s = np.float32(0.0)
+        for j in range(d):
+            s += np.float32(Eq[i, j]) * q[j]
+        scores[i] = s * scales[i]
+    return scores
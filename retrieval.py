@@ -0,0 +1,132 @@
+import json
+import logging
+
+import numpy as np
+
+from kernels import cos_scores, int8_scores, l2norm_inplace, quantize_int8, top_k
+
+logger = logging.getLogger(__name__)
+
+CLAUSES_TABLE = "clauses"
+SUPPORT_DOCS_TABLE = "supporting_docs"
+# Primary keys, used to give paging a stable order
+CLAUSES_KEY = "clause_section_id"
+SUPPORT_DOCS_KEY = "id"
+# Rows the local path needs; if the tables don't provide them we stay on the RPC
+CLAUSE_KEYS = {"clause_section_id", "clause_title", "clause_summary"}
+DOC_KEYS = {"clause_section_id", "embedding", "support_title", "support_summary", "support_url"}
+EMBEDDING_DIM = 768
+PAGE_SIZE = 1000
+# Docs ranked per requested clause before grouping, so each clause can bring several docs
+DOCS_PER_CLAUSE = 8
+# Below this many rows an exact scan beats walking an HNSW graph
+BRUTE_FORCE_MAX = 20000
+# The int8 scan keeps this many candidates per result for float32 rescoring
+RESCORE_FACTOR = 8
+
+
+def _parse_embedding(value):
+    # pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _fetch_all(supabase, table, key):
+    # PostgREST caps each response at its max-rows setting, so page until a request comes back empty;
+    # OFFSET paging only sees every row exactly once under a stable ORDER BY
+    rows = []
+    while True:
+        page = (
+            supabase.table(table).select("*").order(key)
+            .range(len(rows), len(rows) + PAGE_SIZE - 1).execute().data
+        )
+        if not page:
+            return rows
+        rows.extend(page)
+
+
+class LocalIndex:
+    """In-memory kNN over supporting-doc embeddings, grouped by clause like match_supporting_docs_grouped."""
+
+    def __init__(self, clauses, docs):
+        self.clauses = {clause["clause_section_id"]: clause for clause in clauses}
+        self.docs = [{k: v for k, v in doc.items() if k != "embedding"} for doc in docs]
+        embeddings = np.ascontiguousarray(
+            [_parse_embedding(doc["embedding"]) for doc in docs], dtype=np.float32
+        )
+        l2norm_inplace(embeddings)
+        self.embeddings = embeddings
+        # The full scan reads an int8 copy: a quarter of the bytes of the float32 matrix
+        self.embeddings_q, self.scales = quantize_int8(embeddings)
+
+        self.index = None
+        if len(docs) > BRUTE_FORCE_MAX:
+            import hnswlib
+
+            self.index = hnswlib.Index(space="cosine", dim=EMBEDDING_DIM)
+            self.index.init_index(max_elements=len(docs), M=16, ef_construction=200)
+            self.index.add_items(embeddings, np.arange(len(docs)))
+            self.index.set_ef(max(50, 5 * DOCS_PER_CLAUSE))
+
+    def _nearest_docs(self, q, n):
+        if self.index is not None:
+            return self.index.knn_query(q, k=n)[0][0]
+        # int8 rounding can reorder close neighbours, so rescore its shortlist in float32
+        shortlist = top_k(int8_scores(self.embeddings_q, self.scales, q), n * RESCORE_FACTOR)
+        rescored = cos_scores(np.ascontiguousarray(self.embeddings[shortlist]), q)
+        return shortlist[top_k(rescored, n)]
+
+    def search(self, embedding, k=5):
+        """Return the k clauses whose supporting docs rank highest, each with its matching docs best-first."""
+        q = np.ascontiguousarray(embedding, dtype=np.float32)
+        # The kernels don't bounds-check, so a mismatched query must never reach them
+        if q.shape != (EMBEDDING_DIM,):
+            raise ValueError(f"Expected a {EMBEDDING_DIM}-dim query embedding, got shape {q.shape}")
+        grouped = {}
+        for i in self._nearest_docs(q, min(len(self.docs), k * DOCS_PER_CLAUSE)):
+            doc = self.docs[i]
+            cid = doc["clause_section_id"]
+            if cid not in grouped:
+                if len(grouped) == k:
+                    continue
+                grouped[cid] = []
+            grouped[cid].append(doc)
+        return [{**self.clauses[cid], "support_docs": docs} for cid, docs in grouped.items()]
+
+
+def load_local_index(supabase, clauses_table=CLAUSES_TABLE, docs_table=SUPPORT_DOCS_TABLE):
+    """Pull clauses and their supporting docs (with embeddings) from Supabase into a LocalIndex.
+
+    Returns None when the tables are empty or don't have the expected columns, so callers
+    keep using the RPC. Network/API errors propagate.
+    """
+    clauses = _fetch_all(supabase, clauses_table, CLAUSES_KEY)
+    docs = _fetch_all(supabase, docs_table, SUPPORT_DOCS_KEY)
+    if not clauses or not docs:
+        return None
+
+    for table, rows, required in ((clauses_table, clauses, CLAUSE_KEYS), (docs_table, docs, DOC_KEYS)):
+        missing = set().union(*(required - row.keys() for row in rows))
+        if missing:
+            logger.warning("Table %r is missing columns %s; using the RPC instead", table, sorted(missing))
+            return None
+
+    # Docs whose clause isn't in the clauses table can't be rendered, so leave them out
+    clause_ids = {clause["clause_section_id"] for clause in clauses}
+    docs = [doc for doc in docs if doc["clause_section_id"] in clause_ids]
+
+    # Docs not embedded yet (NULL) or embedded with another model can't be scored
+    embedded = []
+    for doc in docs:
+        embedding = doc["embedding"]
+        if embedding is not None:
+            embedding = _parse_embedding(embedding)
+        if embedding is not None and len(embedding) == EMBEDDING_DIM:
+            embedded.append({**doc, "embedding": embedding})
+    if len(embedded) < len(docs):
+        logger.warning(
+            "Skipping %d supporting docs with a missing or non-%d-dim embedding",
+            len(docs) - len(embedded), EMBEDDING_DIM,
+        )
+    if not embedded:
+        return None
+    return LocalIndex(clauses, embedded)
@@ -0,0 +1,45 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+def stream_answers(gemini, prompts, placeholders):
+    """Stream {slot: prompt} concurrently, rendering each into placeholders[slot] as chunks arrive.
+
+    Gemini calls are network-bound, so worker threads overlap them; only the script
+    thread touches Streamlit, draining chunks from a queue. Returns ({slot: answer},
+    {slot: exception}); a failed stream doesn't stop or discard the others.
+    """
+    chunks = queue.Queue()
+
+    def _stream(slot, prompt):
+        try:
+            for chunk in gemini.generate_content(prompt, stream=True):
+                # A closing chunk can carry only a finish reason; its .text raises ValueError
+                if not chunk.parts:
+                    continue
+                chunks.put((slot, chunk.text))
+        except Exception as e:
+            chunks.put((slot, e))
+        finally:
+            chunks.put((slot, None))
+
+    bufs = {slot: [] for slot in prompts}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        for slot, prompt in prompts.items():
+            executor.submit(_stream, slot, prompt)
+        remaining = len(prompts)
+        while remaining:
+            slot, item = chunks.get()
+            if item is None:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                errors[slot] = item
+            else:
+                bufs[slot].append(item)
+                placeholders[slot].markdown("".join(bufs[slot]))
+
+    answers = {slot: "".join(buf).strip() for slot, buf in bufs.items() if slot not in errors}
+    for slot, answer in answers.items():
+        placeholders[slot].markdown(answer)
+    return answers, errors
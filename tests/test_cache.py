@@ -0,0 +1,55 @@
+import numpy as np
+
+from cache import SemanticCache, answer_cache_key
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_semantic_cache_empty_miss():
+    assert SemanticCache(dim=3).lookup(_unit([1, 0, 0])) is None
+
+
+def test_semantic_cache_hit_and_miss_by_threshold():
+    cache = SemanticCache(dim=3, threshold=0.97)
+    clauses = [{"clause_section_id": "1926.501(b)(10)"}]
+    cache.add(_unit([1, 0, 0]), clauses)
+    assert cache.lookup(_unit([1, 0.1, 0])) is clauses  # cosine ~0.995
+    assert cache.lookup(_unit([1, 0.5, 0])) is None  # cosine ~0.894
+
+
+def test_semantic_cache_returns_closest_entry():
+    cache = SemanticCache(dim=3, threshold=0.9)
+    cache.add(_unit([1, 0, 0]), ["a"])
+    cache.add(_unit([0, 1, 0]), ["b"])
+    assert cache.lookup(_unit([0.05, 1, 0])) == ["b"]
+
+
+def test_semantic_cache_evicts_oldest():
+    cache = SemanticCache(dim=3, threshold=0.99, max_entries=2)
+    cache.add(_unit([1, 0, 0]), ["a"])
+    cache.add(_unit([0, 1, 0]), ["b"])
+    cache.add(_unit([0, 0, 1]), ["c"])
+    assert cache.lookup(_unit([1, 0, 0])) is None
+    assert cache.lookup(_unit([0, 0, 1])) == ["c"]
+
+
+def _clause(cid, *urls):
+    return {"clause_section_id": cid, "support_docs": [{"support_url": u} for u in urls]}
+
+
+def test_answer_cache_key_is_stable_and_ignores_outer_whitespace():
+    clauses = [_clause("1926.501", "u1")]
+    assert answer_cache_key("Regulated Builds", "Q?", clauses) == answer_cache_key(
+        "Regulated Builds", "  Q?\n", clauses
+    )
+
+
+def test_answer_cache_key_depends_on_mode_query_and_clauses():
+    base = answer_cache_key("Regulated Builds", "Q?", [_clause("a", "u1"), _clause("b")])
+    assert base != answer_cache_key("Raw Gemini", "Q?", [_clause("a", "u1"), _clause("b")])
+    assert base != answer_cache_key("Regulated Builds", "Q!", [_clause("a", "u1"), _clause("b")])
+    assert base != answer_cache_key("Regulated Builds", "Q?", [_clause("b"), _clause("a", "u1")])
+    assert base != answer_cache_key("Regulated Builds", "Q?", [_clause("a", "u2"), _clause("b")])
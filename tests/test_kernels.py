@@ -0,0 +1,79 @@
+import numpy as np
+
+from kernels import cos_scores, int8_scores, l2norm_inplace, quantize_int8, top_k
+
+
+def _unit_rows(n, d=768, seed=0):
+    E = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    return E / np.linalg.norm(E, axis=1, keepdims=True)
+
+
+def test_l2norm_inplace_matches_numpy():
+    E = np.random.default_rng(1).standard_normal((8, 768)).astype(np.float32)
+    expected = E / np.linalg.norm(E, axis=1, keepdims=True)
+    out = l2norm_inplace(E)
+    assert out is E
+    np.testing.assert_allclose(E, expected, atol=1e-6)
+
+
+def test_l2norm_inplace_leaves_zero_rows():
+    E = np.zeros((2, 4), dtype=np.float32)
+    E[1] = [3, 4, 0, 0]
+    l2norm_inplace(E)
+    np.testing.assert_array_equal(E[0], 0)
+    np.testing.assert_allclose(E[1], [0.6, 0.8, 0, 0])
+
+
+def test_quantize_int8_round_trip():
+    E = _unit_rows(16)
+    Eq, scales = quantize_int8(E)
+    assert Eq.dtype == np.int8 and Eq.flags.c_contiguous
+    assert scales.dtype == np.float32
+    assert np.abs(Eq).max() == 127
+    np.testing.assert_allclose(Eq * scales[:, None], E, atol=scales.max() / 2 + 1e-7)
+
+
+def test_quantize_int8_zero_row():
+    Eq, scales = quantize_int8(np.zeros((1, 4), dtype=np.float32))
+    np.testing.assert_array_equal(Eq, 0)
+    assert scales[0] == 1
+
+
+def test_int8_scores_close_to_float_dot():
+    E = _unit_rows(200)
+    q = E[3].copy()
+    Eq, scales = quantize_int8(E)
+    scores = int8_scores(Eq, scales, q)
+    assert scores.dtype == np.float32
+    np.testing.assert_allclose(scores, E @ q, atol=5e-3)
+    assert top_k(scores, 1)[0] == 3
+
+
+def test_top_k_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+    np.testing.assert_array_equal(top_k(scores, 3), [1, 3, 2])
+
+
+def test_top_k_clamps_to_length():
+    scores = np.array([0.2, 0.4], dtype=np.float32)
+    np.testing.assert_array_equal(top_k(scores, 5), [1, 0])
+
+
+def test_kernels_are_safe_to_call_from_several_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    E = _unit_rows(2000)
+    Eq, scales = quantize_int8(E)
+    q = E[7].copy()
+    expected = int8_scores(Eq, scales, q)
+
+    def work(seed):
+        batch = np.random.default_rng(seed).standard_normal((4, 768)).astype(np.float32)
+        for _ in range(50):
+            l2norm_inplace(batch)
+            cos_scores(E[:320], q)
+            np.testing.assert_allclose(int8_scores(Eq, scales, q), expected)
+        return True
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert all(executor.map(work, range(8)))
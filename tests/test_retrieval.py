@@ -0,0 +1,137 @@
+import json
+
+import numpy as np
+import pytest
+
+import retrieval
+from retrieval import LocalIndex, load_local_index
+
+
+class _Query:
+    _rng = np.random.default_rng(2)
+
+    def __init__(self, rows, max_rows):
+        # Without ORDER BY, each request may see the rows in a different order
+        self.rows = [rows[i] for i in self._rng.permutation(len(rows))]
+        self.max_rows = max_rows
+
+    def select(self, *args):
+        return self
+
+    def order(self, column):
+        self.rows = sorted(self.rows, key=lambda row: row[column])
+        return self
+
+    def range(self, start, end):
+        self.start, self.end = start, end
+        return self
+
+    def execute(self):
+        # Mimic PostgREST's max-rows cap, which can be smaller than the requested range
+        end = min(self.end + 1, self.start + self.max_rows)
+        return type("Response", (), {"data": self.rows[self.start:end]})()
+
+
+class _Supabase:
+    def __init__(self, tables, max_rows=300):
+        self.tables = tables
+        self.max_rows = max_rows
+
+    def table(self, name):
+        return _Query(self.tables[name], self.max_rows)
+
+
+def _corpus(n_clauses=20, n_docs=700, seed=0):
+    rng = np.random.default_rng(seed)
+    clauses = [
+        {"clause_section_id": f"c{i}", "clause_title": f"t{i}", "clause_summary": f"s{i}"}
+        for i in range(n_clauses)
+    ]
+    embeddings = rng.standard_normal((n_docs, 768)).astype(np.float32)
+    docs = [
+        {
+            "id": i,
+            "clause_section_id": f"c{i % n_clauses}",
+            "embedding": json.dumps(embeddings[i].tolist()),
+            "support_title": f"d{i}",
+            "support_summary": "",
+            "support_url": f"u{i}",
+        }
+        for i in range(n_docs)
+    ]
+    return clauses, docs, embeddings
+
+
+def test_load_local_index_pages_past_max_rows():
+    clauses, docs, _ = _corpus()
+    index = load_local_index(_Supabase({"clauses": clauses, "supporting_docs": docs}))
+    assert sorted(doc["id"] for doc in index.docs) == list(range(len(docs)))
+
+
+def test_load_local_index_rejects_missing_columns():
+    clauses, docs, _ = _corpus(n_docs=10)
+    docs = [{k: v for k, v in doc.items() if k != "embedding"} for doc in docs]
+    assert load_local_index(_Supabase({"clauses": clauses, "supporting_docs": docs})) is None
+
+
+def test_load_local_index_empty_tables():
+    assert load_local_index(_Supabase({"clauses": [], "supporting_docs": []})) is None
+
+
+def test_search_groups_docs_by_clause_in_exact_order():
+    clauses, docs, embeddings = _corpus()
+    index = LocalIndex(clauses, docs)
+    q = embeddings[42] / np.linalg.norm(embeddings[42])
+
+    results = index.search(q, k=5)
+
+    assert len(results) == 5
+    assert results[0]["clause_section_id"] == "c2"
+    assert results[0]["support_docs"][0]["support_url"] == "u42"
+    assert "embedding" not in results[0]["support_docs"][0]
+
+    # Clause order follows the exact float32 ranking of their best doc
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = []
+    for i in np.argsort(-(unit @ q)):
+        cid = docs[i]["clause_section_id"]
+        if cid not in expected:
+            expected.append(cid)
+    assert [c["clause_section_id"] for c in results] == expected[:5]
+
+
+def test_load_local_index_skips_null_and_wrong_length_embeddings():
+    clauses, docs, _ = _corpus(n_docs=40)
+    docs[0]["embedding"] = None
+    docs[1]["embedding"] = json.dumps([0.1] * 384)
+    index = load_local_index(_Supabase({"clauses": clauses, "supporting_docs": docs}))
+    assert len(index.docs) == 38
+    assert {"u0", "u1"}.isdisjoint(doc["support_url"] for doc in index.docs)
+
+
+def test_load_local_index_without_any_usable_embedding():
+    clauses, docs, _ = _corpus(n_docs=5)
+    for doc in docs:
+        doc["embedding"] = None
+    assert load_local_index(_Supabase({"clauses": clauses, "supporting_docs": docs})) is None
+
+
+def test_search_rejects_wrong_query_dim():
+    clauses, docs, _ = _corpus(n_docs=10)
+    index = LocalIndex(clauses, docs)
+    with pytest.raises(ValueError):
+        index.search(np.ones(384, dtype=np.float32))
+
+
+def test_search_uses_hnsw_above_brute_force_max(monkeypatch):
+    pytest.importorskip("hnswlib")
+    monkeypatch.setattr(retrieval, "BRUTE_FORCE_MAX", 100)
+    clauses, docs, embeddings = _corpus(n_docs=300)
+    index = LocalIndex(clauses, docs)
+    assert index.index is not None
+
+    q = embeddings[42] / np.linalg.norm(embeddings[42])
+    results = index.search(q, k=5)
+    assert len(results) == 5
+    assert results[0]["clause_section_id"] == "c2"
+    assert results[0]["support_docs"][0]["support_url"] == "u42"
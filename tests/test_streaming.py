@@ -0,0 +1,51 @@
+from streaming import stream_answers
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.parts = [text] if text else []
+        self._text = text
+
+    @property
+    def text(self):
+        # Mirrors google.generativeai: .text raises when the candidate has no parts
+        if not self.parts:
+            raise ValueError("The `response.text` quick accessor requires the response to contain a valid `Part`")
+        return self._text
+
+
+class _Model:
+    def __init__(self, streams):
+        self.streams = streams
+
+    def generate_content(self, prompt, stream=False):
+        assert stream
+        for item in self.streams[prompt]:
+            if isinstance(item, Exception):
+                raise item
+            yield _Chunk(item)
+
+
+class _Placeholder:
+    def __init__(self):
+        self.rendered = []
+
+    def markdown(self, text):
+        self.rendered.append(text)
+
+
+def test_failed_slot_keeps_other_answers():
+    model = _Model({"a": ["Use ", "guardrails. "], "b": ["Partial", RuntimeError("quota exceeded")]})
+    placeholders = {"rb": _Placeholder(), "raw": _Placeholder()}
+    answers, errors = stream_answers(model, {"rb": "a", "raw": "b"}, placeholders)
+    assert answers == {"rb": "Use guardrails."}
+    assert list(errors) == ["raw"] and isinstance(errors["raw"], RuntimeError)
+    assert placeholders["rb"].rendered[-1] == "Use guardrails."
+
+
+def test_chunk_without_parts_does_not_fail_the_slot():
+    model = _Model({"a": ["Answer", None]})
+    placeholders = {"rb": _Placeholder()}
+    answers, errors = stream_answers(model, {"rb": "a"}, placeholders)
+    assert answers == {"rb": "Answer"}
+    assert errors == {}